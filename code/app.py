@@ -1,37 +1,56 @@
 from flask import Flask, request, Response
-from cdr import download_dates, last_updated, download_file
-from browser import init_browser
+from cachetools import TTLCache, cached
+from cdr import download_dates, last_updated, download_file, http_client
+from browser import pool
 from mdrm_dict import mdrm_processes
-import json
+from xbrl import process_file
+import orjson
 from uuid import uuid4
 import os
 import shutil
+import threading
 import datetime
 
 app = Flask(__name__)
 browser = None
 
+# browsers are only a fallback for the HTTP form client and are started on demand;
+# set BROWSER_POOL_WARM=1 to start them in the background at startup instead
+if os.environ.get("BROWSER_POOL_WARM") == "1":
+    threading.Thread(target=pool.warm_pool, daemon=True).start()
+
 @app.route("/")
 def return_rest_options():
-    return json.dumps(
-        ["/bulk_data_sources"]
-    )
+    return Response(orjson.dumps(["/bulk_data_sources"]), mimetype='application/json')
 
 @app.route("/query/bulk_data_sources")
 def return_cdr_data_sources():
-    return json.dumps(["cdr",'ubpr'])
+    return Response(orjson.dumps(["cdr", "ubpr"]), mimetype='application/json')
+
+# the available quarters only change when the FFIEC publishes a new period,
+# so serve repeat queries from memory for an hour
+bulk_data_source_cache = TTLCache(maxsize=4, ttl=3600)
+
+@cached(bulk_data_source_cache, lock=threading.Lock())
+def query_bulk_data_source(data_source):
+    try:
+        return http_client.get_bulk_data_source_info(data_source)
+    except http_client.FormNavigationError as e:
+        print("Falling back to browser:", e)
+
+    with pool.browser_from_pool() as (browser, _):
+        last_updated_date = last_updated.get_last_updated(browser, source_data=data_source)
+        
+        return_dict = {
+            "last_updated": last_updated_date,
+            "quarters": download_dates.populate_download_options(browser, source_data=data_source)
+        }
+
+    return return_dict
 
 @app.route("/query/bulk_data_sources/cdr")
 def return_cdr_dates():
-    browser = init_browser.return_browser()
-    last_updated_date = last_updated.get_last_updated(browser, source_data="CDR")
-    
-    return_dict = {
-        "last_updated": last_updated_date,
-        "quarters": download_dates.populate_download_options(browser, source_data="CDR")
-    }
-
-    return return_dict
+    return query_bulk_data_source("CDR")
 
 # @app.route("/query/bulk_data_sources/ubpr")
 # def return_ubpr_dates():
@@ -50,19 +69,37 @@ def return_cdr_dates():
 
 def download_from_data_source(data_source, quarter):
 
+    # plain HTTP posts to the download form are much faster than driving a browser,
+    # only start a browser if the form didn't hand back a ZIP file
     tmp_dir = '/tmp/' + str(uuid4())
     os.mkdir(tmp_dir)
 
-    browser = init_browser.return_browser(tmp_dir)
-
-    # download the filedo
-
-    ret_str = download_file.init_download(browser, data_source=data_source, quarter=quarter, format=format, download_loc=tmp_dir)
-
-    # delete the do
-    shutil.rmtree(tmp_dir)
-
-    return ret_str
+    try:
+        try:
+            return http_client.init_download(data_source, quarter, tmp_dir)
+        except http_client.FormNavigationError as e:
+            print("Falling back to browser:", e)
+
+        # the pool clears the browser's download directory once the browser is returned,
+        # so move the ZIP file out before giving the browser back
+        with pool.browser_from_pool() as (browser, download_dir):
+            downloaded_file = download_file.init_download(browser, data_source=data_source, quarter=quarter, format=format, download_loc=download_dir)
+            zip_file_name = shutil.move(downloaded_file, tmp_dir)
+
+        # convert outside the with block so the browser isn't held for the whole conversion
+        print("Processing file...", zip_file_name)
+        return process_file.process_xbrl_file(zip_file_name)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def stream_file(json_file_name):
+    # send the processed data from disk in chunks instead of loading it into memory
+    with open(json_file_name, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            yield chunk
 
 @app.route("/download/bulk_data_sources/cdr")
 def return_cdr_file():
@@ -77,12 +114,15 @@ def return_cdr_file():
         # return 400 error if no quarter is specified
         return """A query string parameter named "quarter" is required for this request""", 400
 
-    ret_str = download_from_data_source("CDR", quarter)
+    json_file_name = download_from_data_source("CDR", quarter)
     file_name = "cdr-{}.json".format(quarter)
-    response = Response(ret_str)
+    response = Response(stream_file(json_file_name))
+    # remove the file when the response is closed, which also happens when the body is never
+    # sent (e.g. HEAD requests), unlike a finally block in the generator
+    response.call_on_close(lambda: os.remove(json_file_name))
     response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(file_name)
     response.headers['Content-Type'] = 'application/json'
-    response.headers['Content-Length'] = len(ret_str)
+    response.headers['Content-Length'] = os.path.getsize(json_file_name)
     response.headers['Cache-Control'] = 'no-cache, must-revalidate'
 
 
@@ -102,12 +142,15 @@ def return_ubpr_file():
         return """A query string parameter named "quarter" is required for this request""", 400
 
 
-    ret_str = download_from_data_source("UBPR", quarter)
+    json_file_name = download_from_data_source("UBPR", quarter)
     file_name = "upbr-{}.json".format(quarter)
-    response = Response(ret_str)
+    response = Response(stream_file(json_file_name))
+    # remove the file when the response is closed, which also happens when the body is never
+    # sent (e.g. HEAD requests), unlike a finally block in the generator
+    response.call_on_close(lambda: os.remove(json_file_name))
     response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(file_name)
     response.headers['Content-Type'] = 'application/json'
-    response.headers['Content-Length'] =  len(ret_str)
+    response.headers['Content-Length'] = os.path.getsize(json_file_name)
     response.headers['Cache-Control'] = 'no-cache, must-revalidate'
 
     return response
@@ -127,6 +170,11 @@ def download_mdrm_data_dictionary():
     
     return response
     
+@app.route("/admin/refresh")
+def refresh_cached_queries():
+    bulk_data_source_cache.clear()
+    return Response("cache cleared")
+
 @app.route("/ping")
 def ping():
     response = Response("pong")
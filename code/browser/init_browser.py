@@ -2,7 +2,10 @@ from selenium import webdriver
 from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.options import Options
 
-from uuid import uuid4
+import os
+
+# geckodriver creates the temporary Firefox profile under TMPDIR; keep it in RAM when possible
+PROFILE_TMP_DIR = '/dev/shm'
 
 def return_browser(tmp_dir) -> dict:
     """Creates selenium browser object
@@ -13,7 +16,11 @@ def return_browser(tmp_dir) -> dict:
         dict: Dict containing browser object and download location
     """
 
-    s = Service('/usr/bin/geckodriver')
+    service_env = dict(os.environ)
+    if os.path.isdir(PROFILE_TMP_DIR):
+        service_env['TMPDIR'] = PROFILE_TMP_DIR
+
+    s = Service('/usr/bin/geckodriver', env=service_env)
 
 
     options = Options()
@@ -23,6 +30,14 @@ def return_browser(tmp_dir) -> dict:
     options.set_preference("browser.download.dir", tmp_dir)
     options.set_preference("browser.helperApps.neverAsk.saveToDisk", 
                         "application/pdf, application/octet-string, application/force-download")
+    # the bulk download form only needs the DOM, skip images, caching to disk and background traffic
+    options.set_preference("permissions.default.image", 2)
+    options.set_preference("browser.cache.disk.enable", False)
+    options.set_preference("browser.cache.memory.enable", True)
+    options.set_preference("browser.safebrowsing.enabled", False)
+    options.set_preference("browser.safebrowsing.malware.enabled", False)
+    options.set_preference("toolkit.telemetry.enabled", False)
+    options.set_preference("datareporting.healthreport.uploadEnabled", False)
     options.add_argument("--headless")
     options.add_argument('--disable-gpu')
     driver = webdriver.Firefox(service=s, options=options)
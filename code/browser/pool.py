@@ -0,0 +1,152 @@
+import atexit
+import os
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
+
+from .init_browser import return_browser
+
+"""
+Maintains a bounded pool of warm Firefox/geckodriver instances so that
+requests do not pay the browser startup cost every time.
+Each driver is bound to its own download directory, since the download
+location is a Firefox preference that is fixed when the browser starts.
+WebDriver instances are not thread-safe, so a driver is only ever checked
+out to a single request at a time.
+"""
+
+POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+CHECKOUT_TIMEOUT = 600
+
+_idle = queue.Queue(maxsize=POOL_SIZE)
+_lock = threading.Lock()
+_created = 0
+
+# one permit per browser a request may hold, released when the browser is returned or
+# discarded so a waiting request can take an idle browser or start a new one
+_checkouts = threading.BoundedSemaphore(POOL_SIZE)
+
+
+class BrowserPoolTimeout(Exception):
+    """Raised when no browser becomes available within CHECKOUT_TIMEOUT seconds"""
+
+
+def _reserve_slot() -> bool:
+    """Reserves room in the pool for a new browser, if any is left
+
+    Returns:
+        bool: True if the caller may create a new browser
+    """
+    global _created
+    with _lock:
+        if _created < POOL_SIZE:
+            _created += 1
+            return True
+        return False
+
+
+def _release_slot():
+    global _created
+    with _lock:
+        _created -= 1
+
+
+def _create_entry() -> tuple:
+    """Starts a new browser with a dedicated download directory
+
+    Returns:
+        tuple: (browser, download directory)
+    """
+    download_dir = '/tmp/' + str(uuid4())
+    os.mkdir(download_dir)
+    try:
+        return return_browser(download_dir), download_dir
+    except Exception:
+        shutil.rmtree(download_dir, ignore_errors=True)
+        _release_slot()
+        raise
+
+
+def _reset_entry(driver, download_dir):
+    """Clears browser state and downloaded files before returning a browser to the pool"""
+    driver.delete_all_cookies()
+    driver.get("about:blank")
+    for file_name in os.listdir(download_dir):
+        os.remove(os.path.join(download_dir, file_name))
+
+
+def _discard_entry(driver, download_dir):
+    try:
+        driver.quit()
+    except Exception as e:
+        _ = e  # the browser is already unusable
+    shutil.rmtree(download_dir, ignore_errors=True)
+    _release_slot()
+
+
+def warm_pool():
+    """Starts browsers until the pool is full"""
+    while _reserve_slot():
+        _idle.put(_create_entry())
+
+
+def shutdown_pool():
+    """Quits every idle browser in the pool"""
+    while True:
+        try:
+            driver, download_dir = _idle.get_nowait()
+        except queue.Empty:
+            break
+        _discard_entry(driver, download_dir)
+
+
+@contextmanager
+def browser_from_pool():
+    """Checks a browser out of the pool for the duration of a with block
+
+    A new browser is started if the pool has not reached POOL_SIZE yet,
+    otherwise this blocks until another request returns or discards its browser.
+    On return the browser's cookies and download directory are cleared;
+    browsers that fail to reset are quit and replaced on a later checkout.
+
+    Raises:
+        BrowserPoolTimeout: if no browser is available within CHECKOUT_TIMEOUT seconds
+
+    Yields:
+        tuple: (browser, download directory)
+    """
+    if not _checkouts.acquire(timeout=CHECKOUT_TIMEOUT):
+        raise BrowserPoolTimeout("No browser available after " + str(CHECKOUT_TIMEOUT) + " seconds")
+
+    try:
+        try:
+            entry = _idle.get_nowait()
+        except queue.Empty:
+            if _reserve_slot():
+                entry = _create_entry()
+            else:
+                # every slot is taken by a browser that warm_pool is still starting
+                entry = _idle.get(timeout=CHECKOUT_TIMEOUT)
+    except queue.Empty:
+        _checkouts.release()
+        raise BrowserPoolTimeout("No browser available after " + str(CHECKOUT_TIMEOUT) + " seconds")
+    except Exception:
+        _checkouts.release()
+        raise
+
+    try:
+        yield entry
+    finally:
+        try:
+            _reset_entry(*entry)
+        except Exception as e:
+            _ = e
+            _discard_entry(*entry)
+        else:
+            _idle.put(entry)
+        _checkouts.release()
+
+
+atexit.register(shutdown_pool)
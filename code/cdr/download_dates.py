@@ -1,57 +1,36 @@
-from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 
-import time
-
-from .utils import convert_date_format
+from .utils import convert_date_format, get_option_texts, select_option_by_text
 
 def populate_download_options(browser, source_data="UBPR"):
 
     browser.get('https://cdr.ffiec.gov/public/PWS/DownloadBulkData.aspx')
 
-    form_list_box = None
-
-    attempt_nums = 0
+    WebDriverWait(browser, 10, poll_frequency=0.2).until(
+        EC.presence_of_element_located((By.ID, "ListBox1")))
 
-    while form_list_box is None:
-        try:
-            form_list_box = Select(browser.find_element(By.ID, "ListBox1"))
-        except:
-            attempt_nums += 1
-            if attempt_nums > 10:
-                raise Exception("Could not find form list box")
-            time.sleep(1)
+    # selecting a product posts the page back, which replaces the dates list once the
+    # product's dates are loaded; keep the current list so the reload can be detected
+    old_dates_list_box = browser.find_elements(By.ID, 'DatesDropDownList')
    
     if source_data == 'UBPR':
 
-        for option in form_list_box.options:
-            if option.text == 'UBPR Ratio -- Single Period':
-                option.click()
-                break
+        select_option_by_text(browser, 'ListBox1', 'UBPR Ratio -- Single Period')
     
     elif source_data == 'CDR':
 
-        for option in form_list_box.options:
-            if option.text == 'Call Reports -- Single Period':
-                option.click()
-                break
-
-    attempt_nums = 0
-
+        select_option_by_text(browser, 'ListBox1', 'Call Reports -- Single Period')
 
-    year_list_box = None
+    if old_dates_list_box:
+        WebDriverWait(browser, 30, poll_frequency=0.2).until(EC.staleness_of(old_dates_list_box[0]))
 
-    while year_list_box is None:
-        try:
-            year_list_box = Select(browser.find_element(By.ID, 'DatesDropDownList'))
-        except:
-            attempt_nums += 1
-            if attempt_nums > 10:
-                raise Exception("Could not find form list box")
-            time.sleep(1)
+    WebDriverWait(browser, 10, poll_frequency=0.2).until(
+        EC.presence_of_element_located((By.ID, 'DatesDropDownList')))
 
 
-    potential_dates = [d.text for d in list(year_list_box.options)]
+    potential_dates = get_option_texts(browser, 'DatesDropDownList')
     reformatted_dates = [convert_date_format(d) for d in potential_dates]
 
     return reformatted_dates
\ No newline at end of file
@@ -1,57 +1,79 @@
-from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 
-from xbrl import process_file
+import inotify.adapters
+import inotify.constants
 
 import os
-
 import time
 
-from .utils import convert_date_format, convert_from_yyyymmdd
+from .utils import convert_from_yyyymmdd, get_option_texts, select_option_by_text
+
+# maximum number of seconds to wait for the bulk download to finish
+DOWNLOAD_TIMEOUT = 1800
+
+
+def download_complete(download_loc) -> bool:
+    """Checks whether the browser has finished writing the download
+
+    Args:
+        download_loc (str): directory the browser downloads into
+
+    Returns:
+        bool: True if a non-empty file is present and no partial (.part) files remain
+    """
+    files = os.listdir(download_loc)
+    if any(f.endswith('.part') for f in files):
+        return False
+    # Firefox creates an empty placeholder before the .part file appears
+    return any(os.path.getsize(os.path.join(download_loc, f)) > 0 for f in files)
+
+
+def wait_for_download(watcher, download_loc):
+    """Blocks until the browser has finished writing the download
+
+    Re-checks the download directory whenever the kernel reports that a file in it
+    was closed, renamed or deleted, and at least once a second in case the
+    download finished before the watch was read.
+
+    Args:
+        watcher (inotify.adapters.Inotify): watcher registered on download_loc
+        download_loc (str): directory the browser downloads into
+    """
+    deadline = time.monotonic() + DOWNLOAD_TIMEOUT
+
+    for _ in watcher.event_gen(yield_nones=True):
+        if download_complete(download_loc):
+            return
+        if time.monotonic() > deadline:
+            raise Exception("Timed out waiting for file to download")
+
 
 def init_download(browser, data_source, quarter, format, download_loc):
 
     browser.get('https://cdr.ffiec.gov/public/PWS/DownloadBulkData.aspx')
 
-    form_list_box = None
-
-    attempt_nums = 0
+    WebDriverWait(browser, 10, poll_frequency=0.2).until(
+        EC.presence_of_element_located((By.ID, "ListBox1")))
 
-    while form_list_box is None:
-        try:
-            form_list_box = Select(browser.find_element(By.ID, "ListBox1"))
-        except:
-            attempt_nums += 1
-            if attempt_nums > 10:
-                raise Exception("Could not find form list box")
-            time.sleep(1)
+    # selecting a product posts the page back, which replaces the dates list once the
+    # product's dates are loaded; keep the current list so the reload can be detected
+    old_dates_list_box = browser.find_elements(By.ID, 'DatesDropDownList')
    
     if data_source == 'UBPR':
 
-        for option in form_list_box.options:
-            if option.text == 'UBPR Ratio -- Single Period':
-                option.click()
-                break
+        select_option_by_text(browser, 'ListBox1', 'UBPR Ratio -- Single Period')
     
     elif data_source == 'CDR':
 
-        for option in form_list_box.options:
-            if option.text == 'Call Reports -- Single Period':
-                option.click()
-                break
+        select_option_by_text(browser, 'ListBox1', 'Call Reports -- Single Period')
 
-    attempt_nums = 0
+    if old_dates_list_box:
+        WebDriverWait(browser, 30, poll_frequency=0.2).until(EC.staleness_of(old_dates_list_box[0]))
 
-    year_list_box = None
-
-    while year_list_box is None:
-        try:
-            year_list_box = Select(browser.find_element(By.ID, 'DatesDropDownList'))
-        except:
-            attempt_nums += 1
-            if attempt_nums > 10:
-                raise Exception("Could not find form list box")
-            time.sleep(1)
+    WebDriverWait(browser, 10, poll_frequency=0.2).until(
+        EC.presence_of_element_located((By.ID, 'DatesDropDownList')))
 
 
     # convert the selection date to the format expected by the website
@@ -59,49 +81,33 @@ def init_download(browser, data_source, quarter, format, download_loc):
 
     print("selection date is ", selection_date)
 
-    print("list box options are ", [d.text for d in list(year_list_box.options)])
+    print("list box options are ", get_option_texts(browser, 'DatesDropDownList'))
 
     # select the date in the listbox
-    for option in year_list_box.options:
-        if option.text == selection_date:
-            option.click()
-            break
+    select_option_by_text(browser, 'DatesDropDownList', selection_date)
 
 
     # click the xbrl button
     browser.find_element(By.ID, 'XBRLRadiobutton').click()
 
-    # wait a couple seconds
-    time.sleep(2)
-
     print("Downloading file...")
 
-    # download the file
-    browser.find_element(By.ID, 'Download_0').click()
-
-    file_downloaded = False
-    # get the latest file downloaded in the /home/seluser directory
-    
-    while not file_downloaded:
-        files = os.listdir(download_loc)
-
-        print("found files ", files)
-
-        # do we have a .ZIP file in the folder?
-        file_still_downloading = any(['part' in f for f in files])
+    # watch the download directory before starting the download so no event is missed
+    watcher = inotify.adapters.Inotify(block_duration_s=1)
+    watcher.add_watch(download_loc, mask=inotify.constants.IN_CLOSE_WRITE | inotify.constants.IN_MOVED_TO | inotify.constants.IN_DELETE)
 
-        if not file_still_downloading:
-            file_downloaded = True
-            break
-        print("Waiting for file to download...")
-        time.sleep(1)
+    try:
+        # download the file as soon as the button is clickable
+        WebDriverWait(browser, 10, poll_frequency=0.1).until(
+            EC.element_to_be_clickable((By.ID, 'Download_0'))).click()
 
-    print("File downloaded!")
-    print("Processing file...", file_downloaded)
+        wait_for_download(watcher, download_loc)
+    finally:
+        watcher.remove_watch(download_loc)
 
-    # process the file
-    ret_str = process_file.process_xbrl_file(download_loc + "/" + files[-1])
+    files = sorted(os.listdir(download_loc))
 
-    return ret_str
+    print("File downloaded!", files[-1])
 
-    return True
\ No newline at end of file
+    # return the path of the ZIP file, the caller processes it once the browser is released
+    return download_loc + "/" + files[-1]
\ No newline at end of file
@@ -0,0 +1,216 @@
+import os
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from lxml import html
+
+from xbrl import process_file
+
+from .utils import convert_date_format, convert_from_yyyymmdd
+
+"""
+Drives the FFIEC bulk download page with plain HTTP requests instead of a browser.
+The page is an ASP.NET WebForms page: every interaction is a POST back to the same
+URL carrying the hidden state fields (__VIEWSTATE, __EVENTVALIDATION, ...) from the
+previous response, so a product selection plus a download is two POSTs in one session.
+Form field names are read from the page by element id rather than hard-coded.
+"""
+
+BULK_DOWNLOAD_URL = 'https://cdr.ffiec.gov/public/PWS/DownloadBulkData.aspx'
+
+REQUEST_TIMEOUT = 60
+
+PRODUCT_OPTIONS = {
+    'UBPR': 'UBPR Ratio -- Single Period',
+    'CDR': 'Call Reports -- Single Period'
+}
+
+LAST_UPDATED_IDS = {
+    'UBPR': 'UpdatedTextUBPR',
+    'CDR': 'UpdatedTextCDR'
+}
+
+re_postback_target = re.compile(r"__doPostBack\('([^']*)'")
+re_disposition_file_name = re.compile(r'filename="?([^";]+)"?')
+
+
+class FormNavigationError(Exception):
+    """Raised when the bulk download page does not respond the way a browser session would"""
+
+
+def _new_session() -> requests.Session:
+    """Creates a session for one pass through the form; the ASP.NET session cookie and
+    view state are tied to it, so sessions are not shared between downloads"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:99.0) Gecko/20100101 Firefox/99.0'})
+    # keep the connection alive across the post backs and retry transient failures;
+    # urllib3 does not retry the non-idempotent POSTs by default
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2,
+                                          max_retries=Retry(total=3, backoff_factor=0.5)))
+    return session
+
+
+def _parse_response(resp) -> html.HtmlElement:
+    if not resp.ok:
+        raise FormNavigationError("Bulk download page returned HTTP " + str(resp.status_code))
+    return html.fromstring(resp.content)
+
+
+def _find_element(page, element_id):
+    found = page.xpath('//*[@id=$element_id]', element_id=element_id)
+    if not found:
+        raise FormNavigationError("Could not find " + element_id + " on the bulk download page")
+    return found[0]
+
+
+def _hidden_fields(page) -> dict:
+    """Collects the ASP.NET hidden state fields that must be posted back with every request"""
+    return {el.get('name'): el.get('value', '') for el in page.xpath('//input[@type="hidden"][@name]')}
+
+
+def _option_texts(select) -> list:
+    return [option.text_content().strip() for option in select.xpath('.//option')]
+
+
+def _option_value(select, text) -> str:
+    for option in select.xpath('.//option'):
+        if option.text_content().strip() == text:
+            return option.get('value', text)
+    raise FormNavigationError("Option " + text + " not found in " + str(select.get('id')))
+
+
+def _get_landing_page(session) -> html.HtmlElement:
+    return _parse_response(session.get(BULK_DOWNLOAD_URL, timeout=REQUEST_TIMEOUT))
+
+
+def _select_product(session, page, data_source) -> html.HtmlElement:
+    """Posts back the product selection, which repopulates the dates drop-down
+
+    Args:
+        session (requests.Session): session holding the ASP.NET cookies
+        page (html.HtmlElement): landing page
+        data_source (str): 'CDR' or 'UBPR'
+
+    Returns:
+        html.HtmlElement: page with the dates available for the product
+    """
+    list_box = _find_element(page, 'ListBox1')
+    fields = _hidden_fields(page)
+    fields['__EVENTTARGET'] = list_box.get('name')
+    fields['__EVENTARGUMENT'] = ''
+    fields[list_box.get('name')] = _option_value(list_box, PRODUCT_OPTIONS[data_source])
+
+    resp = session.post(BULK_DOWNLOAD_URL, data=fields, timeout=REQUEST_TIMEOUT)
+    return _parse_response(resp)
+
+
+def _last_updated(page, data_source) -> str:
+    el_text = _find_element(page, LAST_UPDATED_IDS[data_source]).text_content().strip()
+    # the CDR label is prefixed with text, the date is always the last token
+    date_text = el_text.split(' ')[-1].strip()
+    return convert_date_format(date_text)
+
+
+def get_bulk_data_source_info(data_source) -> dict:
+    """Collects the last updated date and available quarters for a data source
+
+    Args:
+        data_source (str): 'CDR' or 'UBPR'
+
+    Returns:
+        dict: last_updated (yyyymmdd) and quarters (list of yyyymmdd)
+    """
+    with _new_session() as session:
+        page = _get_landing_page(session)
+        last_updated_date = _last_updated(page, data_source)
+        page = _select_product(session, page, data_source)
+
+    dates_list_box = _find_element(page, 'DatesDropDownList')
+
+    return {
+        "last_updated": last_updated_date,
+        "quarters": [convert_date_format(d) for d in _option_texts(dates_list_box)]
+    }
+
+
+def _download_fields(page, data_source, quarter) -> dict:
+    """Builds the form post that selects the product, quarter and XBRL format and clicks Download"""
+    fields = _hidden_fields(page)
+    fields['__EVENTTARGET'] = ''
+    fields['__EVENTARGUMENT'] = ''
+
+    list_box = _find_element(page, 'ListBox1')
+    fields[list_box.get('name')] = _option_value(list_box, PRODUCT_OPTIONS[data_source])
+
+    dates_list_box = _find_element(page, 'DatesDropDownList')
+    fields[dates_list_box.get('name')] = _option_value(dates_list_box, convert_from_yyyymmdd(quarter))
+
+    xbrl_radio = _find_element(page, 'XBRLRadiobutton')
+    fields[xbrl_radio.get('name')] = xbrl_radio.get('value')
+
+    # the download control is either a submit button or a __doPostBack link
+    download_button = _find_element(page, 'Download_0')
+    if download_button.tag == 'input':
+        fields[download_button.get('name')] = download_button.get('value', '')
+    else:
+        target = re_postback_target.search(download_button.get('href', ''))
+        if target is None:
+            raise FormNavigationError("Could not determine the post back target of Download_0")
+        fields['__EVENTTARGET'] = target.group(1)
+
+    return fields
+
+
+def _download_file_name(resp, data_source, quarter) -> str:
+    disposition = resp.headers.get('Content-Disposition', '')
+    file_name = re_disposition_file_name.search(disposition)
+    if file_name:
+        return os.path.basename(file_name.group(1))
+    return data_source + "-" + quarter + ".zip"
+
+
+def init_download(data_source, quarter, download_loc):
+    """Downloads and processes a quarterly XBRL bulk data file without a browser
+
+    Args:
+        data_source (str): 'CDR' or 'UBPR'
+        quarter (str): quarter in yyyymmdd format
+        download_loc (str): directory to write the ZIP file to
+
+    Raises:
+        FormNavigationError: if the page structure is unexpected or the response is not a ZIP file
+
+    Returns:
+        str: path of the JSON file holding the processed data, to be removed by the caller
+    """
+    with _new_session() as session:
+        page = _get_landing_page(session)
+        page = _select_product(session, page, data_source)
+        fields = _download_fields(page, data_source, quarter)
+
+        print("Downloading file...")
+
+        with session.post(BULK_DOWNLOAD_URL, data=fields, stream=True, timeout=REQUEST_TIMEOUT) as resp:
+            if not resp.ok:
+                raise FormNavigationError("Download returned HTTP " + str(resp.status_code))
+
+            chunks = resp.iter_content(1 << 16)
+            first_chunk = next(chunks, b'')
+
+            # a ZIP file always starts with the local file header signature
+            if not first_chunk.startswith(b'PK'):
+                raise FormNavigationError("Download did not return a ZIP file")
+
+            file_path = os.path.join(download_loc, _download_file_name(resp, data_source, quarter))
+
+            with open(file_path, 'wb') as f:
+                f.write(first_chunk)
+                for chunk in chunks:
+                    f.write(chunk)
+
+    print("File downloaded!")
+    print("Processing file...", file_path)
+
+    return process_file.process_xbrl_file(file_path)
@@ -1,4 +1,3 @@
-from selenium.webdriver.support.ui import Select
 from selenium.webdriver.common.by import By
 
 from .utils import convert_date_format
@@ -6,7 +5,6 @@ from .utils import convert_date_format
 def get_last_updated(browser, source_data="UBPR")->str:
 
     browser.get('https://cdr.ffiec.gov/public/PWS/DownloadBulkData.aspx')
-    form_list_box = Select(browser.find_element(By.ID, "ListBox1"))
 
     if source_data == 'UBPR':
 
@@ -1,9 +1,43 @@
 def convert_date_format(date_string):
-    date_string = date_string.split('/')
-    new_date_string = date_string[2].zfill(2) + date_string[0].zfill(2) + date_string[1].zfill(2)
-    return new_date_string
+    month, day, year = date_string.split('/')
+    return f"{year:>02}{month:>02}{day:>02}"
 
 
 def convert_from_yyyymmdd(date_string):
     new_date_string = date_string[4:6] + "/" + date_string[6:8] + "/" +date_string[0:4]
-    return new_date_string
\ No newline at end of file
+    return new_date_string
+
+def get_option_texts(browser, element_id):
+    """Returns the text of every option of a select element in a single WebDriver round trip
+    Args:
+        browser (webdriver.Firefox): selenium browser object
+        element_id (str): id of the select element
+    Returns:
+        list: option texts in page order
+    """
+    return browser.execute_script(
+        "return Array.from(document.getElementById(arguments[0]).options).map(o => o.text);", element_id)
+
+
+def select_option_by_text(browser, element_id, text):
+    """Selects the option with the given text and fires its change event in a single WebDriver round trip
+    Args:
+        browser (webdriver.Firefox): selenium browser object
+        element_id (str): id of the select element
+        text (str): text of the option to select
+    Raises:
+        Exception: if no option has the given text, rather than leaving the default selected
+    """
+    found = browser.execute_script("""
+        var select = document.getElementById(arguments[0]);
+        var index = Array.from(select.options).findIndex(o => o.text === arguments[1]);
+        if (index < 0) {
+            return false;
+        }
+        select.selectedIndex = index;
+        select.dispatchEvent(new Event('change', {bubbles: true}));
+        return true;
+    """, element_id, text)
+
+    if not found:
+        raise Exception("Option " + text + " not found in " + element_id)
\ No newline at end of file
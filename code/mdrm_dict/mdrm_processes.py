@@ -1,13 +1,16 @@
 import io
 import re
-import sys
-from uuid import uuid4
+import tempfile
 from zipfile import ZipFile
 from collections import OrderedDict
 from datetime import datetime
-import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+import orjson
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 import numpy as np
 
 """
@@ -21,6 +24,15 @@ TODO: Add support for different output formats
 
 DATA_DICTIONARY_URL = "https://www.federalreserve.gov/apps/mdrm/pdf/MDRM.zip"
 MDRM_CSV_FILE = "MDRM_CSV.csv"
+MAX_IN_MEMORY_ZIP_SIZE = 32 << 20
+MDRM_COLUMN_TYPES = {'Mnemonic': pa.string(), 'Item Code': pa.string()}
+re_html_tag = re.compile(r'<[^<]+?>')
+
+# reuse connections across data dictionary refreshes, and retry transient failures
+http_session = requests.Session()
+http_session.headers.update({'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'mdrm-fetcher/0.1'})
+http_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                           max_retries=Retry(total=3, backoff_factor=0.5)))
 
 
 def iso8601_convert_to_yyyymmdd(t: str) -> str:
@@ -51,44 +63,6 @@ def nan_to_none(x: any) -> any:
         return x
 
 
-def bad_char_replace(x: str) -> str:
-    """Replaces non-processable Windows ISO-8859-1 characters with a zero-length string
-    Args:
-        x (str): character string
-    Returns:
-        str: replaced character string
-    """
-    try:
-        return x.replace('&#x0D;', '')
-    except Exception as e:
-        _ = e  # suppress error message
-        return x
-
-
-def new_line_char_conv(x):
-    try:
-        return x.replace("\n\n", "\n")
-    except Exception as e:
-        _ = e
-        return x
-
-
-def remove_cr(x):
-    try:
-        return x.replace("\r", "")
-    except Exception as e:
-        _ = e
-        return x
-
-
-def strip_html(text):
-    try:
-        return re.sub('<[^<]+?>', '', text)
-    except Exception as e:
-        _ = e
-        return text
-
-
 def collect_latest_data_dictionary_zip() -> bytes:
     """Collects the latest data dictionary zip file from the Federal Reserve
     Collects the latest data dictionary zip file from the Federal Reserve,
@@ -96,25 +70,30 @@ def collect_latest_data_dictionary_zip() -> bytes:
     Returns:
         bytes: Byte array representing the CSV file contained within the downloaded ZIP file.
     """
+    # stream the download into a single buffer that only spills to disk for large files
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=MAX_IN_MEMORY_ZIP_SIZE)
+
     try:
-        response = requests.get(DATA_DICTIONARY_URL)
-        response_bytes = response.content
-        zip_io = io.BytesIO(response_bytes)
-        zip_io.seek(0)
+        with http_session.get(DATA_DICTIONARY_URL, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(1 << 16):
+                zip_buffer.write(chunk)
+        zip_buffer.seek(0)
     except Exception as e:
+        zip_buffer.close()
         raise Exception("Error downloading data dictionary zip file: " + str(e))
 
-    zip_obj = ZipFile(zip_io, 'r')
-    zip_obj_filelist = zip_obj.namelist()
+    with zip_buffer, ZipFile(zip_buffer, 'r') as zip_obj:
+        zip_obj_filelist = zip_obj.namelist()
 
-    # do we have the csv file in the zipfile?
-    try:
-        assert MDRM_CSV_FILE in zip_obj_filelist
-    except AssertionError:
-        raise Exception("MDRM CSV file not found in ZIP file")
+        # do we have the csv file in the zipfile?
+        try:
+            assert MDRM_CSV_FILE in zip_obj_filelist
+        except AssertionError:
+            raise Exception("MDRM CSV file not found in ZIP file")
 
-    # extract the csv file
-    csv_bytes = zip_obj.read(MDRM_CSV_FILE)
+        # extract the csv file
+        csv_bytes = zip_obj.read(MDRM_CSV_FILE)
 
     return csv_bytes
 
@@ -128,10 +107,15 @@ def process_csv(csv_bytes: bytes) -> pd.DataFrame:
     Returns:
         df (pd.DataFrame): Pandas DataFrame representing the attribute data
     """
-    # re-encode the csv_bytes to UTF-8
-    csv_utf8 = csv_bytes.decode('utf-8')
+    # parse the UTF-8 bytes directly with the multithreaded arrow reader;
+    # descriptions contain quoted line breaks, and codes must stay strings
+    table = pa_csv.read_csv(
+        io.BytesIO(csv_bytes),
+        read_options=pa_csv.ReadOptions(skip_rows=1, use_threads=True),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types=MDRM_COLUMN_TYPES, strings_can_be_null=True))
 
-    df = pd.read_csv(io.StringIO(csv_utf8), skiprows=1)
+    df = table.to_pandas()
 
     # check that we have more than 1 row
     assert df.shape[0] > 1
@@ -141,17 +125,16 @@ def process_csv(csv_bytes: bytes) -> pd.DataFrame:
     """
 
     # strip the last two columns of html tags
-    df['SeriesGlossary'] = df['SeriesGlossary'].apply(strip_html)
-    df['Description'] = df['Description'].apply(strip_html)
-
-    # replace bad characters with a zero-length string
-    df = df.applymap(bad_char_replace)
-
-    # strip extra newline characters
-    df = df.applymap(remove_cr)
+    df['SeriesGlossary'] = df['SeriesGlossary'].str.replace(re_html_tag, '', regex=True)
+    df['Description'] = df['Description'].str.replace(re_html_tag, '', regex=True)
 
-    # fix new line characters
-    df = df.applymap(new_line_char_conv)
+    # replace bad characters with a zero-length string, strip extra newline characters
+    # and fix new line characters, vectorized over the text columns only
+    text_columns = df.select_dtypes(include=['object', 'string']).columns
+    df[text_columns] = df[text_columns].apply(
+        lambda col: col.str.replace('&#x0D;', '', regex=False)
+                       .str.replace('\r', '', regex=False)
+                       .str.replace('\n\n', '\n', regex=False))
 
     # remove the last column, which is blank
     df = df.iloc[:, :-1]
@@ -176,11 +159,10 @@ def process_csv(csv_bytes: bytes) -> pd.DataFrame:
     item_type_translator = {'J': 'Projected', 'D': 'Derived', 'F': 'Financial reported',
                             'R': 'Rate', 'S': 'Structure', 'E': 'Examination/Supervision Data', 'P': 'Percentage'}
 
-    df['item_type_explain'] = df.item_type.apply(
-        lambda x: item_type_translator[x])
+    df['item_type_explain'] = df['item_type'].map(item_type_translator)
 
     # convert the Y/N flag for confidentiality to a boolean
-    df['is_conf'] = df.is_conf.apply(lambda x: True if x == 'Y' else False)
+    df['is_conf'] = df['is_conf'] == 'Y'
 
     # # parse the start and end dates into python-format dates
     # uncomment the lines below if running this script manually
@@ -189,13 +171,17 @@ def process_csv(csv_bytes: bytes) -> pd.DataFrame:
 
 
     # create an mdrm field that matches the actual field names
-    df['mdrm'] = df.apply(lambda x: x['mnemonic'] + x['item_code'], axis=1)
+    df['mdrm'] = df['mnemonic'].astype(str) + df['item_code'].astype(str)
 
     # drop duplicate rows before we convert the reporting forms to a list
     df = df.drop_duplicates()
 
     # convert the reporting form comma-delimited string to a list
-    df['reporting_forms'] = df.reporting_form.apply(lambda x: x.split(',') if type(x) == str else [])
+    # rows without a reporting form get an empty list
+    reporting_forms = df['reporting_form'].str.split(',')
+    missing_forms = reporting_forms.isna()
+    reporting_forms[missing_forms] = pd.Series([[] for _ in range(missing_forms.sum())], index=reporting_forms.index[missing_forms])
+    df['reporting_forms'] = reporting_forms
 
     # remove the reporting form column
     df = df.drop(columns=['reporting_form'])
@@ -205,6 +191,6 @@ def process_csv(csv_bytes: bytes) -> pd.DataFrame:
 def return_json_mdrm_record():
     data_dict_bytes = collect_latest_data_dictionary_zip()
     data_dict_df = process_csv(data_dict_bytes)
-    data_dict_json_output = data_dict_df.to_json(orient='records')
+    data_dict_json_output = orjson.dumps(data_dict_df.to_dict(orient='records'))
     return data_dict_json_output
     
\ No newline at end of file
@@ -1,99 +1,134 @@
-import json
 import io
+import orjson
 import zipfile
 from tqdm import tqdm
-import re
-import xmltodict
-from itertools import chain
+from lxml import etree
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from uuid import uuid4
 
-re_date = re.compile('[0-9]{4}\-[0-9]{2}\-[0-9]{2}')
-
-re_date = re.compile('[0-9]{4}\-[0-9]{2}\-[0-9]{2}')
+# namespace prefixes of the call report and UBPR concepts
+XBRL_PREFIXES = ('cc', 'uc')
+
+# upper bound on worker processes per conversion, concurrent downloads each get their own pool
+MAX_WORKERS = int(os.environ.get("XBRL_MAX_WORKERS", min(4, os.cpu_count() or 1)))
+
+# workers are started from a forkserver rather than forked from the threaded Flask process,
+# so they can't inherit locks held by other request threads
+mp_context = multiprocessing.get_context('forkserver')
+
+# coalesce the per-document writes into large sequential writes to the output file
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+def _usd_to_thousands(value):
+    # amounts are filed in dollars rounded to thousands, so the result is normally
+    # an exact integer; a float is only returned for values that are not
+    dollars = int(value)
+    thousands, remainder = divmod(dollars, 1000)
+    if remainder:
+        return dollars / 1000
+    return thousands
+
+# value converter and data type for each numeric unitRef
+UNIT_CONVERTERS = {
+    'USD': (_usd_to_thousands, 'int'),
+    'PURE': (float, 'float'),
+    'NON-MONETARY': (float, 'float')
+}
+
+BOOL_VALUES = {'true': True, 'false': False}
+
+def _init_worker(file_name):
+    """Opens the archive once in each worker process"""
+    global _worker_zip
+    _worker_zip = zipfile.ZipFile(file_name, 'r')
+
+def _process_member(member_name):
+    try:
+        # serialize in the worker so only bytes are pickled back to the parent
+        return orjson.dumps(process_xml(_worker_zip.read(member_name)))
+    except Exception as e:
+        print(f"Error processing {member_name}: {e}")
+        return None
 
 def process_xbrl_file(file_name) -> str:
-    with open(file_name, 'rb') as file:
-        raw_data = file.read()
+    """Converts the RSSD XBRL documents in a bulk download ZIP file into a JSON file
+
+    The JSON is written to a temporary file so that the full dataset never has to be
+    held in memory; the caller is responsible for removing the file.
 
-    zip_io = io.BytesIO(raw_data)
-    zip_stream = zipfile.ZipFile(zip_io)
-    files_list = [f for f in zip_stream.filelist if f.filename.endswith('.xml') and 'RSSD' in f.filename]
+    Args:
+        file_name (str): path of the bulk download ZIP file
 
+    Returns:
+        str: path of the JSON file
+    """
     tmp_file_name = '/tmp/' + str(uuid4())
 
-    # Write an opening bracket to the temp_file_name
-    with open(tmp_file_name, 'w') as f:
-        f.write('[\n')
-
-    for i, file in tqdm(enumerate(files_list), total=len(files_list)):
-        if 'RSSD' in file.filename:
-            data = zip_stream.open(file).read()
-            try:
-                processed_data = process_xml(data)
-                with open(tmp_file_name, 'a') as f:
-                    json.dump(processed_data, f, indent=4)
-                    if i < len(files_list) - 1:
-                        f.write(',\n')
-                    else:
-                        f.write('\n')
-            except Exception as e:
-                print(f"Error processing {file.filename}: {e}")
-
-    # Write a closing bracket to the temp_file_name
-    with open(tmp_file_name, 'a') as f:
-        f.write(']')
-
-    # Read the complete JSON data
-    with open(tmp_file_name, 'r') as f:
-        ret_str = f.read()
-
-    os.remove(tmp_file_name)
-    return ret_str
+    # open the archive by path so zipfile seeks within the file instead of holding it in memory
+    with zipfile.ZipFile(file_name, 'r') as zip_stream:
+        files_list = [f.filename for f in zip_stream.filelist if f.filename.endswith('.xml') and 'RSSD' in f.filename]
 
-def process_xml(data):
-    dict_data = xmltodict.parse(data.decode('utf-8'))['xbrl']
-    keys_to_parse = list(filter(lambda x: 'cc:' in x, dict_data.keys())) + list(filter(lambda x: 'uc:' in x, dict_data.keys()))
-    parsed_data = list(chain.from_iterable(filter(None, (process_xbrl_item(x, dict_data[x]) for x in keys_to_parse))))
-    
-    ret_data = []
-    for row in parsed_data:
-        new_dict = {
-            'mdrm': row['mdrm'],
-            'rssd': row['rssd'],
-            'quarter': row['quarter'],
-            f"{row['data_type']}_data": row['value']
-        }
-        ret_data.append(new_dict)
-    
-    return ret_data
+    # the output file is opened once and written incrementally rather than reopened per document
+    with open(tmp_file_name, 'wb', buffering=OUTPUT_BUFFER_SIZE) as f:
+        f.write(b'[')
 
-def process_xbrl_item(name, items):
-    if not isinstance(items, list):
-        items = [items]
+        # XML parsing is CPU bound, so spread the members across processes;
+        # each worker reads its members from its own handle on the archive
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=mp_context, initializer=_init_worker, initargs=(file_name,)) as executor:
+            results = executor.map(_process_member, files_list, chunksize=32)
 
-    results = []
-    for item in items:
-        context = item.get('@contextRef')
-        unit_type = item.get('@unitRef')
-        value = item.get('#text')
-        mdrm = name.replace("cc:", "").replace("uc:", "")
-        rssd = context.split('_')[1]
-        quarter = re_date.findall(context)[0]
+            first = True
+            for processed_data in tqdm(results, total=len(files_list)):
+                if processed_data is None:
+                    continue
+                # separators go before each entry so a failed last document cannot leave a trailing comma
+                if not first:
+                    f.write(b',')
+                f.write(processed_data)
+                first = False
 
-        data_type = 'str'  # Default data type
-        if unit_type == 'USD':
-            value = int(value) / 1000
-            data_type = 'int'
-        elif unit_type in ['PURE', 'NON-MONETARY']:
-            value = float(value)
-            data_type = 'float'
-        elif value in ['true', 'false']:
-            value = value == 'true'
-            data_type = 'bool'
+        f.write(b']')
 
-        results.append({'mdrm': mdrm, 'rssd': rssd, 'value': value, 'data_type': data_type, 'quarter': quarter})
+    return tmp_file_name
 
-    return results
+def process_xml(data):
+    ret_data = []
+
+    # stream the document and only keep the call report (cc:) and UBPR (uc:) facts
+    for _, elem in etree.iterparse(io.BytesIO(data), events=('end',)):
+        if elem.prefix in XBRL_PREFIXES:
+            value = (elem.text or '').strip() or None
+            ret_data.append(process_xbrl_item(etree.QName(elem).localname, elem.get('contextRef'), elem.get('unitRef'), value))
 
+        # free elements that have been processed, the document is never needed as a whole
+        # (the root has no parent, but comments or PIs before it are still its siblings)
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    return ret_data
 
+def process_xbrl_item(mdrm, context, unit_type, value):
+    # contexts are named <prefix>_<rssd>_<yyyy-mm-dd>, so the quarter is at a fixed offset
+    _, rssd, period = context.split('_', 2)
+    # check the date separators so a context in another format is reported rather than
+    # emitted with a corrupt quarter
+    if period[4:5] != '-' or period[7:8] != '-':
+        raise ValueError("Unexpected contextRef format: " + context)
+    quarter = period[:10]
+
+    converter = UNIT_CONVERTERS.get(unit_type)
+    if converter is not None:
+        convert, data_type = converter
+        value = convert(value)
+    elif value in BOOL_VALUES:
+        value = BOOL_VALUES[value]
+        data_type = 'bool'
+    else:
+        data_type = 'str'
+
+    return {'mdrm': mdrm, 'rssd': rssd, 'quarter': quarter, f"{data_type}_data": value}
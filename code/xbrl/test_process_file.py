@@ -0,0 +1,35 @@
+import pytest
+
+from xbrl import process_file
+
+
+XBRL_DOCUMENT = b"""<?xml version="1.0" encoding="utf-8"?>
+%s
+<xbrl xmlns="http://www.xbrl.org/2003/instance" xmlns:cc="http://www.ffiec.gov/xbrl/call/concepts">
+  <context id="CI_1000_2020-03-31"/>
+  <cc:RCON2170 contextRef="CI_1000_2020-03-31" unitRef="USD" decimals="-3">144272000</cc:RCON2170>
+  <cc:RCON9999 contextRef="CI_1000_2020-03-31">true</cc:RCON9999>
+</xbrl>
+"""
+
+EXPECTED = [
+    {'mdrm': 'RCON2170', 'rssd': '1000', 'quarter': '2020-03-31', 'int_data': 144272},
+    {'mdrm': 'RCON9999', 'rssd': '1000', 'quarter': '2020-03-31', 'bool_data': True}
+]
+
+
+def test_process_xml():
+    assert process_file.process_xml(XBRL_DOCUMENT % b'') == EXPECTED
+
+
+def test_process_xml_comment_before_root():
+    assert process_file.process_xml(XBRL_DOCUMENT % b'<!-- generated by the FFIEC CDR -->') == EXPECTED
+
+
+def test_process_xml_processing_instruction_before_root():
+    assert process_file.process_xml(XBRL_DOCUMENT % b'<?xml-stylesheet type="text/xsl" href="cdr.xsl"?>') == EXPECTED
+
+
+def test_process_xbrl_item_rejects_unexpected_context():
+    with pytest.raises(ValueError):
+        process_file.process_xbrl_item('RCON2170', 'X_1_foo_2023-03-31', 'USD', '1000')